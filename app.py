@@ -1,14 +1,10 @@
 import streamlit as st
-from supabase import create_client
-import pandas as pd
 from io import BytesIO
-from openpyxl import load_workbook
 import time
-import requests
-from urllib.parse import urlparse, urlunparse
 from datetime import datetime
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
+# pandas / supabase / httpx / slack_sdk импортируются лениво - только там, где нужны
+# (холодный старт и первая отрисовка не ждут тяжелых модулей)
+from matching import build_site_query, match_indexed, pack_serp_items, unpack_serp_items
 
 # -----------------------
 # Конфигурация страницы
@@ -55,6 +51,12 @@ TRANSLATIONS = {
         "run_queue": "🚀 Check Queue",
         "rerun_all": "🔄 Re-check All",
         "del_selected": "🗑 Delete {} links",
+        "move_to": "Move to folder",
+        "move_selected": "📦 Move {} links",
+        "bulk_actions": "⚙️ All links here",
+        "move_all": "📦 Move all links",
+        "delete_all": "🗑 Delete all links",
+        "confirm_delete_all": "Yes, delete all {} links",
         "add_links_title": "📥 Add links to '{}'",
         "paste_links": "Paste links list:",
         "save_btn": "💾 Save",
@@ -82,7 +84,21 @@ TRANSLATIONS = {
         "links_count": "Links count",
         "in_index": "In Index",
         "in_queue": "In Queue",
-        "db_error_retry": "⚠️ DB Connection failed. Retrying..."
+        "db_error_retry": "⚠️ DB Connection failed. Retrying...",
+        "serp_exp": "🔎 Stored SERP: {}",
+        "serp_missing": "No stored SERP for this link yet. Run a check first.",
+        "serp_empty": "Google returned no organic results for this query.",
+        "serp_limit": "Stored SERP is shown for the first {} of {} selected links.",
+        "priority": "Priority",
+        "plan_tasks": "Planned tasks",
+        "plan_cost": "Est. cost",
+        "plan_time": "Est. duration",
+        "plan_deferred": "Stays in queue",
+        "budget_info": "Budget per run: {} | Spent today: ${:.2f} of {}",
+        "no_limit": "no limit",
+        "budget_exhausted": "⛔ Daily budget is exhausted. Links stay in queue.",
+        "budget_stop": "⛔ Budget cap reached. Remaining {} links stay in queue.",
+        "bad_price": "⚠️ [planner] price_per_task must be greater than 0."
     },
     "uk": {
         "nav_title": "Навігація",
@@ -116,6 +132,12 @@ TRANSLATIONS = {
         "run_queue": "🚀 Перевірити чергу",
         "rerun_all": "🔄 Переперевірити все",
         "del_selected": "🗑 Видалити {} посилань",
+        "move_to": "Перемістити в папку",
+        "move_selected": "📦 Перемістити {} посилань",
+        "bulk_actions": "⚙️ Усі посилання тут",
+        "move_all": "📦 Перемістити всі посилання",
+        "delete_all": "🗑 Видалити всі посилання",
+        "confirm_delete_all": "Так, видалити всі {} посилань",
         "add_links_title": "📥 Додати посилання в '{}'",
         "paste_links": "Вставте список посилань:",
         "save_btn": "💾 Зберегти",
@@ -143,7 +165,21 @@ TRANSLATIONS = {
         "links_count": "Кількість",
         "in_index": "В індексі",
         "in_queue": "В черзі",
-        "db_error_retry": "⚠️ З'єднання з БД втрачено. Повторна спроба..."
+        "db_error_retry": "⚠️ З'єднання з БД втрачено. Повторна спроба...",
+        "serp_exp": "🔎 Збережена видача: {}",
+        "serp_missing": "Для цього посилання ще немає збереженої видачі. Спершу запустіть перевірку.",
+        "serp_empty": "Google не повернув органічних результатів для цього запиту.",
+        "serp_limit": "Збережена видача показана для перших {} з {} виділених посилань.",
+        "priority": "Пріоритет",
+        "plan_tasks": "Заплановано задач",
+        "plan_cost": "Орієнт. вартість",
+        "plan_time": "Орієнт. тривалість",
+        "plan_deferred": "Залишиться в черзі",
+        "budget_info": "Бюджет на запуск: {} | Витрачено сьогодні: ${:.2f} з {}",
+        "no_limit": "без ліміту",
+        "budget_exhausted": "⛔ Денний бюджет вичерпано. Посилання залишаються в черзі.",
+        "budget_stop": "⛔ Досягнуто ліміту бюджету. {} посилань залишаються в черзі.",
+        "bad_price": "⚠️ [planner] price_per_task має бути більшим за 0."
     }
 }
 
@@ -165,23 +201,61 @@ if "selected_project_id" not in st.session_state:
 if "selected_folder_id" not in st.session_state:
     st.session_state.selected_folder_id = None 
 
+# Транспорт: пул соединений с keep-alive и HTTP/2 (httpx[http2])
+DFS_POOL_SIZE = 20        # одновременных соединений к DataForSEO на процесс
+DB_TIMEOUT = 30           # сек. на запрос к Supabase (PostgREST)
+RETRY_ATTEMPTS = 3
+RETRY_BACKOFF = 0.5       # сек., удваивается на каждой попытке
+
+# Клиенты создаются один раз на процесс и переиспользуются всеми сессиями и rerun-ами
 @st.cache_resource
 def init_supabase():
+    # PostgREST-клиент supabase уже работает через httpx с HTTP/2 и пулом соединений
+    from supabase import create_client, ClientOptions
     url = st.secrets["supabase"]["url"]
     key = st.secrets["supabase"]["key"]
-    return create_client(url, key)
+    return create_client(url, key, options=ClientOptions(postgrest_client_timeout=DB_TIMEOUT))
+
+@st.cache_resource
+def init_dfs_client():
+    import httpx
+    limits = httpx.Limits(
+        max_connections=DFS_POOL_SIZE,
+        max_keepalive_connections=DFS_POOL_SIZE,
+        keepalive_expiry=60
+    )
+    # retries на транспорте повторяют только ошибки установки соединения -> безопасно и для POST
+    transport = httpx.HTTPTransport(http2=True, limits=limits, retries=RETRY_ATTEMPTS)
+    return httpx.Client(
+        transport=transport,
+        auth=(st.secrets["dataforseo"]["login"], st.secrets["dataforseo"]["password"]),
+        headers={"Content-Type": "application/json", "Accept-Encoding": "gzip"},
+        timeout=httpx.Timeout(60, connect=10)
+    )
+
+def is_transient(e):
+    # Обрыв keep-alive / HTTP/2 соединения (httpx.ReadError, RemoteProtocolError, таймауты)
+    import httpx
+    return isinstance(e, httpx.TransportError)
+
+def with_retry(fn, attempts=RETRY_ATTEMPTS):
+    """Calls fn(), retrying transient network errors with exponential backoff"""
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == attempts - 1 or not is_transient(e):
+                raise
+            time.sleep(RETRY_BACKOFF * 2 ** attempt)
 
-def init_requests():
-    s = requests.Session()
-    s.auth = (st.secrets["dataforseo"]["login"], st.secrets["dataforseo"]["password"])
-    s.headers.update({"Content-Type": "application/json"})
-    return s
+def db_exec(query):
+    """Executes an idempotent PostgREST query (select/update/upsert/delete) with retry"""
+    return with_retry(query.execute)
 
-try:
-    supabase = init_supabase()
-except Exception as e:
-    st.error(f"DB Connection Error: {e}")
-    st.stop()
+@st.cache_resource
+def init_slack(token):
+    from slack_sdk import WebClient
+    return WebClient(token=token)
 
 # -----------------------
 # ХЕЛПЕРЫ
@@ -192,7 +266,7 @@ def send_slack_file(file_bytes, filename, message):
             token = st.secrets["slack"].get("bot_token")
             channel = st.secrets["slack"].get("channel_id")
             if token and channel:
-                client = WebClient(token=token)
+                client = init_slack(token)
                 client.files_upload_v2(
                     channel=channel, file=file_bytes, filename=filename, title=filename, initial_comment=message
                 )
@@ -201,32 +275,33 @@ def send_slack_file(file_bytes, filename, message):
         st.error(t("slack_error").format(e))
 
 def to_excel(df):
+    import pandas as pd
     output = BytesIO()
     with pd.ExcelWriter(output, engine='openpyxl') as writer:
         df.to_excel(writer, index=False, sheet_name='Report')
     return output.getvalue()
 
-def norm_url(u: str) -> str:
-    p = urlparse(u.strip())
-    netloc = (p.netloc or "").lower()
-    if netloc.startswith("www."): netloc = netloc[4:]
-    path = (p.path or "").rstrip("/")
-    return urlunparse(("", netloc, path, "", "", "")).lower()
-
-def build_site_query(url: str) -> str:
-    p = urlparse(url.strip())
-    host = (p.netloc or "").lower()
-    if host.startswith("www."): host = host[4:]
-    path = (p.path or "").strip().lstrip("/").rstrip("/")
-    return f"site:{host}" if path in ("", "/") else f"site:{host}/{path}"
-
-def match_indexed(original_url: str, items):
-    orig = norm_url(original_url)
-    for it in items:
-        if it.get("type") == "organic":
-            u = it.get("url")
-            if u and norm_url(u) == orig: return True
-    return False
+def save_serp_result(task_id, link_id, items):
+    # Одна строка на task_id (upsert) -> повторная запись того же таска не дублируется
+    try:
+        blob, count = pack_serp_items(items)
+        db_exec(supabase.table("serp_results").upsert({
+            "task_id": task_id,
+            "link_id": link_id,
+            "items": blob,
+            "items_count": count
+        }, on_conflict="task_id"))
+    except Exception as e:
+        print(f"SERP store error for {task_id}: {e}")
+
+SERP_PREVIEW_LIMIT = 10  # сколько выделенных строк раскрывать с сохраненной выдачей
+
+@st.cache_data(show_spinner=False, ttl=300)
+def load_serp_items(task_id):
+    # Распаковываем только по запросу из UI (выделенные строки)
+    res = db_exec(supabase.table("serp_results").select("items").eq("task_id", task_id).limit(1))
+    if not res.data: return None
+    return unpack_serp_items(res.data[0]["items"])
 
 def parse_text_urls(text_input):
     urls = []
@@ -240,22 +315,192 @@ def parse_text_urls(text_input):
 
 # Функция с защитой от сбоев сети (Retry)
 def safe_fetch(table, select="*", order_col=None):
+    query = supabase.table(table).select(select)
+    if order_col:
+        query = query.order(order_col, desc=(order_col == "created_at"))
     try:
-        query = supabase.table(table).select(select)
-        if order_col:
-            query = query.order(order_col, desc=(order_col == "created_at"))
-        return query.execute().data
+        return db_exec(query).data
     except Exception as e:
-        # Если ошибка, ждем и пробуем еще раз
-        time.sleep(1)
-        try:
-            query = supabase.table(table).select(select)
-            if order_col:
-                query = query.order(order_col, desc=(order_col == "created_at"))
-            return query.execute().data
-        except Exception as e2:
-            st.error(f"Failed to fetch data: {e2}")
-            return []
+        st.error(f"Failed to fetch data: {e}")
+        return []
+
+# -----------------------
+# МАССОВЫЕ ОПЕРАЦИИ (НА СЕРВЕРЕ)
+# -----------------------
+# Один запрос на всю область (проект / папка / статус), без списков id в URL.
+# returning="minimal" -> сервер не отдает обратно измененные строки.
+ALL_FOLDERS = "all"  # folder_id=None означает корень проекта, ALL_FOLDERS - любые папки
+
+def scope_filter(query, project_id=None, folder_id=ALL_FOLDERS, status=None):
+    if project_id is None:
+        query = query.neq("id", 0)  # PostgREST не принимает UPDATE/DELETE без фильтра
+    else:
+        query = query.eq("project_id", project_id)
+    if folder_id is None:
+        query = query.is_("folder_id", "null")
+    elif folder_id != ALL_FOLDERS:
+        query = query.eq("folder_id", folder_id)
+    if status:
+        query = query.eq("status", status)
+    return query
+
+def requeue_scope(project_id=None, folder_id=ALL_FOLDERS, status=None):
+    query = supabase.table("links").update({"status": "pending", "is_indexed": None}, returning="minimal")
+    db_exec(scope_filter(query, project_id, folder_id, status))
+
+def move_scope(target_folder_id, project_id, folder_id=ALL_FOLDERS, status=None):
+    query = supabase.table("links").update({"folder_id": target_folder_id}, returning="minimal")
+    db_exec(scope_filter(query, project_id, folder_id, status))
+
+def delete_scope(project_id, folder_id=ALL_FOLDERS, status=None):
+    query = supabase.table("links").delete(returning="minimal")
+    db_exec(scope_filter(query, project_id, folder_id, status))
+
+# Выделенные строки: id уходят в теле POST (RPC), а не в строке запроса
+def delete_links(ids):
+    db_exec(supabase.rpc("delete_links", {"p_ids": [int(i) for i in ids]}))
+
+def move_links(ids, target_folder_id):
+    db_exec(supabase.rpc("move_links", {"p_ids": [int(i) for i in ids], "p_folder_id": target_folder_id}))
+
+def links_report(ids):
+    # id уходят в теле RPC; ответ читаем постранично (лимит max-rows PostgREST)
+    params = {"p_ids": [int(i) for i in ids]}
+    rows = []
+    while True:
+        page = db_exec(supabase.rpc("links_report", params).range(len(rows), len(rows) + PAGE_SIZE - 1)).data
+        rows += page
+        if len(page) < PAGE_SIZE: return rows
+
+def delete_folder(folder_id):
+    # Ссылки и папка удаляются в одной транзакции (функция delete_folder в БД)
+    db_exec(supabase.rpc("delete_folder", {"p_folder_id": folder_id}))
+
+# -----------------------
+# ПЛАНИРОВЩИК ЗАПУСКОВ (БЮДЖЕТ / ПРИОРИТЕТ)
+# -----------------------
+# Настройки в secrets.toml, секция [planner] (все ключи необязательные):
+#   price_per_task = 0.0006   # $ за один task_post (тариф DataForSEO)
+#   run_budget = 5.0          # $ на один запуск
+#   daily_budget = 20.0       # $ в сутки (UTC)
+DEFAULT_PRICE_PER_TASK = 0.0006
+DEFAULT_TASKS_PER_SEC = 2.0   # пока нет истории запусков в check_runs
+PAGE_SIZE = 1000              # лимит строк PostgREST на один запрос
+
+def planner_config():
+    cfg = st.secrets.get("planner", {})
+    price = float(cfg.get("price_per_task", DEFAULT_PRICE_PER_TASK))
+    if price <= 0:
+        # Без цены нельзя посчитать ни план, ни лимит бюджета
+        st.error(t("bad_price"))
+        st.stop()
+    return {
+        "price": price,
+        "run_budget": cfg.get("run_budget"),
+        "daily_budget": cfg.get("daily_budget"),
+    }
+
+def spent_today():
+    today = datetime.utcnow().strftime('%Y-%m-%d')
+    rows = db_exec(supabase.table("check_runs").select("cost").gte("started_at", today)).data
+    return sum(float(r["cost"] or 0) for r in rows)
+
+def budget_left(cfg, spent_day, spent_run=0.0):
+    """Remaining $ (min of per-run and per-day caps), None = unlimited"""
+    caps = []
+    if cfg["run_budget"] is not None:
+        caps.append(max(0.0, float(cfg["run_budget"]) - spent_run))
+    if cfg["daily_budget"] is not None:
+        caps.append(max(0.0, float(cfg["daily_budget"]) - spent_day))
+    return min(caps) if caps else None
+
+def historical_throughput():
+    # Задач в секунду по последним завершенным запускам
+    rows = db_exec(
+        supabase.table("check_runs").select("tasks, started_at, finished_at")
+        .order("started_at", desc=True).limit(20)
+    ).data
+    tasks, secs = 0, 0.0
+    for r in rows:
+        if not r.get("finished_at") or not r.get("tasks"): continue
+        started = datetime.fromisoformat(r["started_at"])
+        finished = datetime.fromisoformat(r["finished_at"])
+        tasks += r["tasks"]
+        secs += (finished - started).total_seconds()
+    return tasks / secs if tasks and secs > 0 else DEFAULT_TASKS_PER_SEC
+
+def plan_run(projects, pending_by_project, cfg, spent_day):
+    """
+    Builds a run plan: projects by priority (desc), links by age inside a project.
+    Only counts are used here - links are fetched by collect_planned_links().
+    """
+    price = cfg["price"]
+    budget = budget_left(cfg, spent_day)
+    max_tasks = None if budget is None else int(budget // price)
+
+    ordered = sorted(projects, key=lambda p: (-(p.get("priority") or 0), p["id"]))
+    quota = []
+    planned = 0
+    for p in ordered:
+        pend = pending_by_project.get(p["id"], 0)
+        take = pend if max_tasks is None else min(pend, max_tasks - planned)
+        if take > 0:
+            quota.append((p["id"], take))
+            planned += take
+
+    total_pending = sum(pending_by_project.values())
+    return {
+        "quota": quota,
+        "tasks": planned,
+        "cost": planned * price,
+        "seconds": planned / historical_throughput() if planned else 0,
+        "deferred": total_pending - planned,
+        "budget": budget,
+        "config": cfg,
+        "spent_today": spent_day,
+    }
+
+def project_stats():
+    """Per-project link counts aggregated in the DB (project_stats function), no row download"""
+    try:
+        rows = db_exec(supabase.rpc("project_stats")).data
+    except Exception as e:
+        st.error(f"Failed to fetch data: {e}")
+        return {}
+    return {r["project_id"]: r for r in rows}
+
+def collect_planned_links(plan):
+    links = []
+    for project_id, take in plan["quota"]:
+        # Сначала самые старые ссылки проекта (id по возрастанию), постранично
+        for offset in range(0, take, PAGE_SIZE):
+            end = min(take, offset + PAGE_SIZE) - 1
+            links += db_exec(
+                supabase.table("links").select("id, url")
+                .eq("project_id", project_id).eq("status", "pending")
+                .order("id").range(offset, end)
+            ).data
+    return links
+
+# Строка check_runs создается до первого task_post и обновляется после каждого пакета:
+# прерванный запуск (rerun / закрытая вкладка) все равно учитывается в spent_today()
+def start_run():
+    # Без retry: повторный INSERT после обрыва создал бы лишнюю строку
+    res = supabase.table("check_runs").insert({
+        "started_at": datetime.utcnow().isoformat(),
+        "tasks": 0,
+        "cost": 0
+    }).execute()
+    return res.data[0]["id"]
+
+def update_run(run_id, tasks, cost, finished=False):
+    fields = {"tasks": tasks, "cost": cost}
+    if finished:
+        fields["finished_at"] = datetime.utcnow().isoformat()
+    try:
+        db_exec(supabase.table("check_runs").update(fields, returning="minimal").eq("id", run_id))
+    except Exception as e:
+        print(f"Run stats error: {e}")
 
 # -----------------------
 # ЛОГИКА ПРОВЕРКИ
@@ -267,9 +512,11 @@ def run_check(links_data, report_name_prefix="Report"):
     - 20000: Success (Check items for index)
     - 40102: No Search Results (Not Indexed)
     - 40601/40602: Polling (Wait and retry)
+    Stops posting new batches once the budget cap is reached; the rest stays pending.
     """
     if not links_data: return
-    session = init_requests()
+    import pandas as pd
+    session = init_dfs_client()
     host = st.secrets["dataforseo"].get("host", "api.dataforseo.com").replace("https://", "")
     base_url = f"https://{host}"
     
@@ -277,6 +524,18 @@ def run_check(links_data, report_name_prefix="Report"):
     status_text = st.empty()
     payload = []
     tasks_map = {} 
+    checked_ids = []
+    posted = 0
+    tasks_posted = 0
+    cfg = planner_config()
+    price = cfg["price"]
+    spent = 0.0
+    try:
+        run_id = start_run()
+    except Exception as e:
+        # Без учета расхода нельзя соблюдать дневной лимит
+        st.error(f"Run stats error: {e}")
+        return
     
     # 1. Prepare payload
     for item in links_data:
@@ -295,6 +554,23 @@ def run_check(links_data, report_name_prefix="Report"):
     for i in range(0, total, BATCH_SIZE):
         batch_links = links_data[i : i + BATCH_SIZE]
         batch_payload = payload[i : i + BATCH_SIZE]
+
+        # Лимит бюджета: урезаем последний пакет, остальное остается в очереди.
+        # Дневной расход перечитываем перед каждым пакетом - он учитывает и параллельные запуски
+        try:
+            spent_day = spent_today() if cfg["daily_budget"] is not None else 0.0
+        except Exception as e:
+            # Расход неизвестен - дальше не отправляем, остаток остается в очереди
+            st.error(f"Run stats error: {e}")
+            break
+        budget = budget_left(cfg, spent_day, spent)
+        if budget is not None:
+            affordable = int(budget // price)
+            if affordable <= 0:
+                break
+            batch_links = batch_links[:affordable]
+            batch_payload = batch_payload[:affordable]
+        posted += len(batch_links)
         
         msg_proc = t("processing").format(i+1, min(i+BATCH_SIZE, total), total)
         status_text.write(msg_proc)
@@ -305,6 +581,11 @@ def run_check(links_data, report_name_prefix="Report"):
             res = r.json()
             
             if res.get('status_code') == 20000:
+                # Фактическая стоимость из ответа API, иначе - по тарифу
+                spent += float(res.get('cost') or len(batch_payload) * price)
+                tasks_posted += len(batch_payload)
+                update_run(run_id, tasks_posted, spent)
+                checked_ids += [l['id'] for l in batch_links]
                 batch_ids = []
                 for idx, task in enumerate(res.get('tasks', [])):
                     if task.get('id'):
@@ -336,23 +617,25 @@ def run_check(links_data, report_name_prefix="Report"):
                                 items = (task_res.get('result') or [{}])[0].get('items', [])
                                 url_obj = next(l for l in batch_links if l['id'] == link_id)
                                 is_ind = match_indexed(url_obj['url'], items)
+                                save_serp_result(tid, link_id, items)
                                 
-                                supabase.table("links").update({
+                                db_exec(supabase.table("links").update({
                                     "status": "done", 
                                     "is_indexed": is_ind, 
                                     "last_check": datetime.utcnow().isoformat(), 
                                     "task_id": tid
-                                }).eq("id", link_id).execute()
+                                }).eq("id", link_id))
                                 break 
 
                             # CASE B: No Search Results (40102) -> Definitely Not Indexed
                             elif status_code == 40102:
-                                supabase.table("links").update({
+                                save_serp_result(tid, link_id, [])
+                                db_exec(supabase.table("links").update({
                                     "status": "done", 
                                     "is_indexed": False,  # Explicitly False
                                     "last_check": datetime.utcnow().isoformat(), 
                                     "task_id": tid
-                                }).eq("id", link_id).execute()
+                                }).eq("id", link_id))
                                 break 
 
                             # CASE C: Wait (40602 Queue / 40601 Handed)
@@ -365,7 +648,7 @@ def run_check(links_data, report_name_prefix="Report"):
                             else:
                                 error_msg = task_res.get('status_message', 'Unknown API Error')
                                 print(f"API Error for {tid}: {error_msg}")
-                                supabase.table("links").update({"status": "error"}).eq("id", link_id).execute()
+                                db_exec(supabase.table("links").update({"status": "error"}).eq("id", link_id))
                                 break 
 
                         except Exception as e:
@@ -373,7 +656,7 @@ def run_check(links_data, report_name_prefix="Report"):
                             time.sleep(1)
                     else:
                         # Timeout
-                        supabase.table("links").update({"status": "timeout"}).eq("id", link_id).execute()
+                        db_exec(supabase.table("links").update({"status": "timeout"}).eq("id", link_id))
 
             else:
                 st.error(f"API Error: {res.get('status_message')}")
@@ -385,19 +668,28 @@ def run_check(links_data, report_name_prefix="Report"):
             st.error(f"Global Net Error: {e}")
             time.sleep(1.5)
 
+    if posted < total:
+        st.warning(t("budget_stop").format(total - posted))
+    if tasks_posted:
+        update_run(run_id, tasks_posted, spent, finished=True)
+    else:
+        # Ничего не отправлено - пустая строка не нужна ни для расхода, ни для статистики
+        try:
+            db_exec(supabase.table("check_runs").delete(returning="minimal").eq("id", run_id))
+        except Exception as e:
+            print(f"Run stats error: {e}")
+
     # 3. Report Generation
     status_text.write(t("sending_report"))
     try:
-        checked_ids = [item['id'] for item in links_data]
-        res = supabase.table("links").select("url, status, is_indexed, last_check").in_("id", checked_ids).execute()
-        df_report = pd.DataFrame(res.data)
+        df_report = pd.DataFrame(links_report(checked_ids) if checked_ids else [])
         
         if not df_report.empty:
             excel_bytes = to_excel(df_report)
             date_str = datetime.now().strftime('%Y-%m-%d')
             fname = f"{report_name_prefix}_{date_str}.xlsx"
             
-            msg = t("report_msg").format(report_name_prefix, total)
+            msg = t("report_msg").format(report_name_prefix, len(checked_ids))
             send_slack_file(excel_bytes, fname, msg)
     except Exception as e:
         st.error(f"Report Generation Error: {e}")
@@ -415,6 +707,7 @@ def render_link_interface(project_id, folder_id=None, folder_name=""):
     - Сохраняет СТРОГИЙ порядок строк (как в файле)
     - Умно ищет колонку с ссылкой (приоритет на Referring Page)
     """
+    import pandas as pd
     
     # ---------------------------------------------------------
     # 1. ЗАГРУЗКА И ОТОБРАЖЕНИЕ (СОРТИРОВКА ПО ВОЗРАСТАНИЮ ID)
@@ -429,7 +722,7 @@ def render_link_interface(project_id, folder_id=None, folder_name=""):
     # !!! ГЛАВНОЕ ИСПРАВЛЕНИЕ ПОРЯДКА !!!
     # desc=False означает "от старых к новым". 
     # Получаем от 0 до 50 000 записей
-    links = query.order("id", desc=False).range(0, 50000).execute().data
+    links = db_exec(query.order("id", desc=False).range(0, 50000)).data
     
     df = pd.DataFrame(links)
 
@@ -453,8 +746,25 @@ def render_link_interface(project_id, folder_id=None, folder_name=""):
                     run_check(to_check, report_name_prefix=f"Check_{folder_name}")
             else:
                 if st.button(t("rerun_all"), key=f"rerun_{folder_id}", width="stretch"):
-                    ids = df['id'].tolist()
-                    supabase.table("links").update({"status": "pending", "is_indexed": None}).in_("id", ids).execute()
+                    requeue_scope(project_id, folder_id)
+                    st.rerun()
+
+        # Папки проекта, куда можно переносить ссылки.
+        # Корень (folder_id = NULL) не предлагаем: при наличии папок его ссылки в UI не видны
+        names = {f['id']: f['name'] for f in all_folders if f['project_id'] == project_id}
+        targets = [fid for fid in names if fid != folder_id]
+
+        # Действия над всей папкой - одним запросом на сервере
+        with st.popover(t("bulk_actions")):
+            if targets:
+                all_target = st.selectbox(t("move_to"), targets, format_func=names.get, key=f"move_all_to_{folder_id}")
+                if st.button(t("move_all"), key=f"move_all_{folder_id}", width="stretch"):
+                    move_scope(all_target, project_id, folder_id)
+                    st.rerun()
+                st.divider()
+            if st.checkbox(t("confirm_delete_all").format(total), key=f"del_all_ok_{folder_id}"):
+                if st.button(t("delete_all"), type="primary", key=f"del_all_{folder_id}", width="stretch"):
+                    delete_scope(project_id, folder_id)
                     st.rerun()
 
         st.write("")
@@ -471,14 +781,42 @@ def render_link_interface(project_id, folder_id=None, folder_name=""):
             }
         )
         
-        # Удаление
+        # Удаление / перемещение
         if len(selection.selection.rows) > 0:
             sel_idx = selection.selection.rows
             sel_ids = df.iloc[sel_idx]['id'].tolist()
             if st.button(t("del_selected").format(len(sel_ids)), key=f"del_sel_{folder_id}"):
-                supabase.table("links").delete().in_("id", sel_ids).execute()
+                delete_links(sel_ids)
                 st.rerun()
 
+            if targets:
+                c_move, c_move_btn = st.columns([3, 1])
+                with c_move:
+                    target_id = st.selectbox(t("move_to"), targets, format_func=names.get, key=f"move_to_{folder_id}")
+                with c_move_btn:
+                    st.write("")
+                    if st.button(t("move_selected").format(len(sel_ids)), key=f"move_sel_{folder_id}", width="stretch"):
+                        move_links(sel_ids, target_id)
+                        st.rerun()
+
+            # Сохраненная выдача только для выделенных строк (грузим и распаковываем по требованию)
+            if len(sel_idx) > SERP_PREVIEW_LIMIT:
+                st.caption(t("serp_limit").format(SERP_PREVIEW_LIMIT, len(sel_idx)))
+            for _, row in df.iloc[sel_idx[:SERP_PREVIEW_LIMIT]].iterrows():
+                with st.expander(t("serp_exp").format(row['url'])):
+                    tid = row.get('task_id')
+                    serp = load_serp_items(tid) if isinstance(tid, str) and tid else None
+                    if serp is None:
+                        st.info(t("serp_missing"))
+                    elif not serp:
+                        st.caption(t("serp_empty"))
+                    else:
+                        st.dataframe(
+                            pd.DataFrame(serp, columns=["position", "url"]),
+                            hide_index=True,
+                            width="stretch"
+                        )
+
     st.divider()
     
     # ---------------------------------------------------------
@@ -615,7 +953,14 @@ with st.sidebar:
     
     st.divider()
     
-    # === SAFE FETCHING FOR SIDEBAR (FIX FOR httpx.ReadError) ===
+    # Подключение к БД - после первой отрисовки сайдбара (клиент кэшируется на процесс)
+    try:
+        supabase = init_supabase()
+    except Exception as e:
+        st.error(f"DB Connection Error: {e}")
+        st.stop()
+
+    # === SAFE FETCHING FOR SIDEBAR (retry on httpx.ReadError via db_exec) ===
     projs = safe_fetch("projects", order_col="created_at")
     all_folders = safe_fetch("folders", order_col="name")
     
@@ -671,25 +1016,25 @@ if not st.session_state.selected_project_id:
         st.info(t("no_projs"))
     else:
         # Статистика
-        # Используем безопасную загрузку
-        all_links = safe_fetch("links", select="id, project_id, status, is_indexed")
-        df_all = pd.DataFrame(all_links)
+        # Счетчики считает БД: выгрузка всех ссылок упиралась бы в лимит max-rows
+        import pandas as pd
+        stats = project_stats()
         
         stats_data = []
         global_pending_count = 0
+        pending_by_project = {}
         
         for p in projs:
-            if not df_all.empty:
-                p_links = df_all[df_all['project_id'] == p['id']]
-                cnt = len(p_links)
-                pend = len(p_links[p_links['status'] == 'pending'])
-                idx = len(p_links[p_links['is_indexed'] == True])
-            else:
-                cnt, pend, idx = 0, 0, 0
+            p_stats = stats.get(p['id'], {})
+            cnt = p_stats.get('total', 0)
+            pend = p_stats.get('pending', 0)
+            idx = p_stats.get('indexed', 0)
             
             global_pending_count += pend
+            pending_by_project[p['id']] = pend
             stats_data.append({
                 t("project"): p['name'],
+                t("priority"): p.get('priority') or 0,
                 t("links_count"): cnt,
                 t("in_index"): idx,
                 t("in_queue"): pend
@@ -704,14 +1049,28 @@ if not st.session_state.selected_project_id:
         
         if global_pending_count > 0:
             st.warning(t("ready_global").format(global_pending_count))
-            if st.button(t("run_global"), type="primary", width="stretch"):
-                 pending_full = supabase.table("links").select("id, url").eq("status", "pending").execute().data
+
+            # План запуска: стоимость, длительность и что останется в очереди
+            cfg = planner_config()
+            plan = plan_run(projs, pending_by_project, cfg, spent_today())
+            fmt_budget = lambda v: f"${float(v):.2f}" if v is not None else t("no_limit")
+            st.caption(t("budget_info").format(fmt_budget(cfg["run_budget"]), plan["spent_today"], fmt_budget(cfg["daily_budget"])))
+            c1, c2, c3, c4 = st.columns(4)
+            c1.metric(t("plan_tasks"), plan["tasks"])
+            c2.metric(t("plan_cost"), f"${plan['cost']:.2f}")
+            c3.metric(t("plan_time"), f"{plan['seconds'] / 60:.1f} min")
+            c4.metric(t("plan_deferred"), plan["deferred"])
+
+            if plan["tasks"] == 0:
+                st.error(t("budget_exhausted"))
+            elif st.button(t("run_global"), type="primary", width="stretch"):
+                 pending_full = collect_planned_links(plan)
                  run_check(pending_full, report_name_prefix="Global_Check")
         else:
             st.success(t("queue_empty"))
             st.write("")
             if st.button(t("reset_global")):
-                supabase.table("links").update({"status": "pending", "is_indexed": None}).neq("id", 0).execute()
+                requeue_scope()
                 st.rerun()
 
 # 2. ВНУТРИ ПРОЕКТА
@@ -742,13 +1101,22 @@ elif st.session_state.selected_project_id:
 
     # 2.2 ЕСЛИ МЫ В КОРНЕ ПРОЕКТА
     else:
-        st.title(f"📂 {curr_proj['name']}")
+        c_title, c_prio = st.columns([5, 1])
+        with c_title:
+            st.title(f"📂 {curr_proj['name']}")
+        with c_prio:
+            # Приоритет проекта для планировщика (больше -> проверяется раньше)
+            prio = st.number_input(t("priority"), value=int(curr_proj.get('priority') or 0), step=1, key=f"prio_{curr_proj['id']}")
+            if prio != (curr_proj.get('priority') or 0):
+                db_exec(supabase.table("projects").update({"priority": int(prio)}).eq("id", curr_proj['id']))
+                st.rerun()
         
         # Если ЕСТЬ папки -> Показываем структуру папок
         if p_folders:
+            import pandas as pd
             st.caption(t("folder_struct"))
             
-            links_res = supabase.table("links").select("folder_id, status, is_indexed").eq("project_id", curr_proj['id']).execute()
+            links_res = db_exec(supabase.table("links").select("folder_id, status, is_indexed").eq("project_id", curr_proj['id']))
             df_links = pd.DataFrame(links_res.data)
             
             for f in p_folders:
@@ -772,7 +1140,7 @@ elif st.session_state.selected_project_id:
                     with c3:
                         st.write("")
                         if st.button(t("del_btn"), key=f"del_f_{f['id']}"):
-                            supabase.table("folders").delete().eq("id", f['id']).execute()
+                            delete_folder(f['id'])
                             st.rerun()
             
             st.divider()
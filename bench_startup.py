@@ -0,0 +1,63 @@
+"""
+Замер холодного старта и rerun-а приложения.
+
+    python bench_startup.py                 # импорт модулей + AppTest (нужен .streamlit/secrets.toml)
+    python bench_startup.py --imports-only
+
+Каждый импорт меряется в отдельном процессе, чтобы не было прогретого sys.modules.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+MODULES = ["streamlit", "matching", "pandas", "supabase", "httpx", "slack_sdk", "openpyxl"]
+
+def cold_import(module, repeat):
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        if out.returncode != 0:
+            return None
+        runs.append(float(out.stdout.strip()))
+    return statistics.median(runs)
+
+def bench_app(repeat, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    t0 = time.perf_counter()
+    at = AppTest.from_file("app.py", default_timeout=timeout)
+    at.run()
+    cold = time.perf_counter() - t0
+
+    reruns = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        at.run()
+        reruns.append(time.perf_counter() - t0)
+    return cold, statistics.median(reruns), at.exception
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup / rerun benchmark")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--imports-only", action="store_true")
+    args = parser.parse_args()
+
+    print("Cold import (median, ms):")
+    for m in MODULES:
+        sec = cold_import(m, args.repeat)
+        print(f"  {m:<10} " + ("not installed" if sec is None else f"{sec * 1000:8.1f}"))
+
+    if args.imports_only: return
+
+    cold, rerun, exc = bench_app(args.repeat, args.timeout)
+    print(f"App first run: {cold * 1000:8.1f} ms")
+    print(f"App rerun:     {rerun * 1000:8.1f} ms (median of {args.repeat})")
+    if exc:
+        print(f"Warning: app raised {exc}")
+
+if __name__ == "__main__":
+    main()
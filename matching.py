@@ -0,0 +1,101 @@
+# ==========================================
+# ПРАВИЛА НОРМАЛИЗАЦИИ И СОПОСТАВЛЕНИЯ URL
+# ==========================================
+# Без зависимости от Streamlit: модуль используется и приложением (app.py),
+# и офлайн-перепроверкой сохраненной выдачи (rematch.py) в пуле процессов.
+
+import re
+import json
+import gzip
+import base64
+from urllib.parse import urlparse, urlunparse, unquote, quote, parse_qsl, urlencode
+
+# Параметры, которые не влияют на контент страницы
+TRACKING_PARAMS = ("utm_", "gclid", "fbclid", "yclid", "msclkid", "_ga")
+INDEX_PAGES = ("index.html", "index.htm", "index.php", "default.aspx", "default.asp")
+DEFAULT_PORTS = ("80", "443")
+SCHEME_RE = re.compile(r"^[a-z][a-z0-9+.-]*://", re.I)
+ENCODED_SLASH_RE = re.compile(r"%2f", re.I)
+
+def _norm_host(netloc: str) -> str:
+    host = netloc.rsplit("@", 1)[-1].lower()
+    port = ""
+    if not host.startswith("[") and host.count(":") == 1:
+        host, port = host.split(":")
+    host = host.rstrip(".")
+    if host.startswith("www."): host = host[4:]
+    # IDN: кириллические и punycode-домены приводим к одному виду (xn--...)
+    try:
+        host = host.encode("idna").decode("ascii")
+    except UnicodeError:
+        pass
+    if port and port not in DEFAULT_PORTS:
+        host = f"{host}:{port}"
+    return host
+
+def _norm_path(path: str) -> str:
+    # Единый вид percent-encoding: %D1%82 и "т" считаются одинаковыми.
+    # %2F не раскодируем - это другой путь, чем "/"
+    path = "%2F".join(
+        quote(unquote(part), safe="/:@!$&'()*+,;=-._~")
+        for part in ENCODED_SLASH_RE.split(path or "")
+    )
+    for page in INDEX_PAGES:
+        if path.lower().endswith("/" + page):
+            path = path[: -len(page)]
+            break
+    return path.rstrip("/")
+
+def _norm_query(query: str) -> str:
+    params = [
+        (k, v) for k, v in parse_qsl(query or "", keep_blank_values=True)
+        if not k.lower().startswith(TRACKING_PARAMS)
+    ]
+    return urlencode(sorted(params))
+
+def norm_url(u: str) -> str:
+    u = u.strip()
+    if not SCHEME_RE.match(u) and not u.startswith("//"): u = "//" + u  # URL без протокола
+    p = urlparse(u)
+    netloc = _norm_host(p.netloc or "")
+    path = _norm_path(p.path)
+    query = _norm_query(p.query)
+    # Протокол и #fragment на индексацию не влияют
+    return urlunparse(("", netloc, path, "", query, "")).lower()
+
+def build_site_query(url: str) -> str:
+    p = urlparse(url.strip())
+    host = (p.netloc or "").lower()
+    if host.startswith("www."): host = host[4:]
+    path = (p.path or "").strip().lstrip("/").rstrip("/")
+    return f"site:{host}" if path in ("", "/") else f"site:{host}/{path}"
+
+def match_urls(original_url: str, urls) -> bool:
+    orig = norm_url(original_url)
+    for u in urls:
+        if u and norm_url(u) == orig: return True
+    return False
+
+def match_indexed(original_url: str, items):
+    return match_urls(original_url, (it.get("url") for it in items if it.get("type") == "organic"))
+
+# -----------------------
+# ХРАНЕНИЕ ВЫДАЧИ
+# -----------------------
+def pack_serp_items(items):
+    """
+    Compact storage for SERP: only organic [position, url] pairs,
+    gzip-compressed and base64-encoded so it fits a plain text column.
+    """
+    rows = [
+        [it.get("rank_absolute"), it.get("url")]
+        for it in (items or [])
+        if it.get("type") == "organic" and it.get("url")
+    ]
+    raw = json.dumps(rows, separators=(",", ":")).encode("utf-8")
+    return base64.b64encode(gzip.compress(raw)).decode("ascii"), len(rows)
+
+def unpack_serp_items(blob):
+    """Reverse of pack_serp_items -> list of [position, url]"""
+    if not blob: return []
+    return json.loads(gzip.decompress(base64.b64decode(blob)))
@@ -0,0 +1,137 @@
+"""
+Офлайн-перепроверка сохраненной выдачи (serp_results) по текущим правилам
+из matching.py. API DataForSEO не вызывается.
+
+    python rematch.py --dry-run              # только отчет
+    python rematch.py --workers 8 --out flips.csv
+
+Секреты берутся из .streamlit/secrets.toml (секция [supabase]).
+Нужны SQL-функции stored_serp_page и apply_rematch (см. README).
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+import tomllib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from supabase import create_client
+
+from matching import match_urls, unpack_serp_items
+
+PAGE_SIZE = 1000      # лимит строк PostgREST на один запрос
+RANGES_PER_WORKER = 8 # диапазонов id на процесс (равномернее нагрузка при "дырах" в id)
+UPDATE_BATCH = 5000   # строк в одном вызове apply_rematch (идут в теле POST)
+
+_client = None  # свой клиент в каждом процессе пула
+
+def load_client(secrets_path):
+    with open(secrets_path, "rb") as f:
+        secrets = tomllib.load(f)
+    return create_client(secrets["supabase"]["url"], secrets["supabase"]["key"])
+
+def init_worker(secrets_path):
+    global _client
+    _client = load_client(secrets_path)
+
+def id_bounds(supabase):
+    first = supabase.table("links").select("id").order("id").limit(1).execute().data
+    last = supabase.table("links").select("id").order("id", desc=True).limit(1).execute().data
+    if not first: return None
+    return first[0]["id"], last[0]["id"] + 1
+
+def split_ranges(lo, hi, parts):
+    step = max(1, -(-(hi - lo) // parts))
+    return [(start, min(hi, start + step)) for start in range(lo, hi, step)]
+
+def fetch_range(supabase, lo, hi):
+    """
+    Keyset pagination over [lo, hi) of link ids via stored_serp_page.
+    The server returns only checked links (status 'done', is_indexed set)
+    joined with the SERP of their latest task, so skipped blobs are never downloaded.
+    """
+    after = lo - 1
+    while True:
+        rows = supabase.rpc("stored_serp_page", {
+            "p_after": after, "p_to": hi, "p_limit": PAGE_SIZE
+        }).execute().data
+        if not rows: return
+        yield from rows
+        if len(rows) < PAGE_SIZE: return
+        after = rows[-1]["id"]
+
+def rematch_range(bounds):
+    """Worker: fetches its id range and returns (link_id, task_id, url, old, new) for rows whose state flips"""
+    lo, hi = bounds
+    scanned = 0
+    flips = []
+    for r in fetch_range(_client, lo, hi):
+        scanned += 1
+        old = r["is_indexed"]
+        if old not in (True, False): continue
+        new = match_urls(r["url"], (u for _, u in unpack_serp_items(r["items"])))
+        if old is not new:
+            flips.append((r["id"], r["task_id"], r["url"], old, new))
+    return scanned, flips
+
+def apply_flips(supabase, flips):
+    """
+    Writes new is_indexed values via apply_rematch. The server only updates rows
+    that are still 'done' with the same task_id, so links re-queued or re-checked
+    after the scan keep their fresh state. Returns the number of updated rows.
+    """
+    updated = 0
+    for i in range(0, len(flips), UPDATE_BATCH):
+        rows = [
+            {"id": link_id, "task_id": task_id, "is_indexed": new}
+            for link_id, task_id, _, _, new in flips[i:i+UPDATE_BATCH]
+        ]
+        updated += supabase.rpc("apply_rematch", {"p_rows": rows}).execute().data or 0
+    return updated
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score stored SERP results with current matching rules.")
+    parser.add_argument("--secrets", default=os.path.join(".streamlit", "secrets.toml"))
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--dry-run", action="store_true", help="report flips without updating links")
+    parser.add_argument("--out", help="write flipped links to this CSV file")
+    args = parser.parse_args()
+
+    supabase = load_client(args.secrets)
+    started = time.time()
+    scanned = 0
+    flips = []
+
+    bounds = id_bounds(supabase)
+    if bounds is None:
+        print("No links found.")
+        return
+
+    # Загрузка и сопоставление идут параллельно: каждый процесс читает свой диапазон id
+    ranges = split_ranges(*bounds, args.workers * RANGES_PER_WORKER)
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(args.secrets,)) as pool:
+        futures = [pool.submit(rematch_range, r) for r in ranges]
+        for done, fut in enumerate(as_completed(futures), 1):
+            n, chunk_flips = fut.result()
+            scanned += n
+            flips.extend(chunk_flips)
+            print(f"\rRanges {done}/{len(ranges)} | scanned {scanned}...", end="", file=sys.stderr)
+
+    to_true = sum(1 for f in flips if f[4])
+    print(f"\nScanned: {scanned} | Flipped: {len(flips)} "
+          f"(-> indexed: {to_true}, -> not indexed: {len(flips) - to_true}) "
+          f"in {time.time() - started:.1f}s")
+
+    if args.out:
+        with open(args.out, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["id", "task_id", "url", "old_is_indexed", "new_is_indexed"])
+            writer.writerows(flips)
+
+    if flips and not args.dry_run:
+        updated = apply_flips(supabase, flips)
+        print(f"Updated {updated} links ({len(flips) - updated} changed since the scan, skipped).")
+
+if __name__ == "__main__":
+    main()